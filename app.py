@@ -1,36 +1,466 @@
 # app.py (GeniusMind v2 - Dashboard Powerhouse)
 
 import os
-from flask import Flask, render_template, request, jsonify
+import logging
+from logging.handlers import MemoryHandler
+from flask import Flask, Response, render_template, request, jsonify
+from flask.json.provider import JSONProvider
 from dotenv import load_dotenv
 import requests
-import google.generativeai as genai
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 import json
+import orjson
 import re
+from string import Template
+import hashlib
+import threading
+import time
+from itertools import islice
+from functools import lru_cache
+import diskcache
+from cachetools import TTLCache
+from urllib.parse import urlencode
 
 # Load environment variables
 load_dotenv()
 app = Flask(__name__)
 
+# --- Logging ---
+# Set LOG_BUFFER (as the Procfile does) to batch records into one write per N lines; warnings flush at once.
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+_log_buffer = int(os.getenv("LOG_BUFFER", "0"))
+logging.basicConfig(level=logging.INFO, handlers=[
+    MemoryHandler(_log_buffer, flushLevel=logging.WARNING, target=_stream_handler) if _log_buffer else _stream_handler
+])
+logger = logging.getLogger(__name__)
+
+class RedactSecretsFilter(logging.Filter):
+    """Masks the given secrets in every record the handler emits, including third-party ones like urllib3's retry warnings."""
+    # Shorter values are placeholders, not real keys, and masking them would mangle ordinary words in the log.
+    MIN_SECRET_LEN = 8
+
+    def __init__(self, *secrets):
+        super().__init__()
+        self._secrets = [secret for secret in secrets if secret and len(secret) >= self.MIN_SECRET_LEN]
+
+    def filter(self, record):
+        message = record.getMessage()
+        if any(secret in message for secret in self._secrets):
+            for secret in self._secrets: message = message.replace(secret, "***")
+            record.msg, record.args = message, None
+        return True
+
+# --- Fast JSON ---
+class OrjsonProvider(JSONProvider):
+    """Serves jsonify() and request.json through orjson instead of the stdlib json module."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # orjson already emits bytes; hand them to the response as-is instead of a str Flask re-encodes.
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), mimetype="application/json")
+
+app.json = OrjsonProvider(app)
+
 # --- API Key Configuration ---
 FMP_API_KEY = os.getenv("FMP_API_KEY")
+FMP_BASE_URL = "https://financialmodelingprep.com/api"
+# Fixed query params, built once; per-call params are merged on top.
+_UNIVERSE_PARAMS = {'volumeMoreThan': 50000, 'limit': 10000}
+_RSI_PARAMS = {'period': 14, 'type': 'rsi'}
+_SMA_PARAMS = {'period': 50, 'type': 'sma'}
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print(f"CRITICAL STARTUP ERROR: Could not configure Gemini AI. Error: {e}")
+REDIS_URL = os.getenv("REDIS_URL")
+# The FMP key rides in each request's query string, and urllib3 logs that URL on every retry.
+_stream_handler.addFilter(RedactSecretsFilter(FMP_API_KEY, GEMINI_API_KEY))
+
+# --- Gemini Model ---
+# Gemini's JSON mode enforces this shape server-side, so the reply parses directly with no scraping.
+RECOMMENDATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "ticker": {"type": "string"},
+            "company_name": {"type": "string"},
+            "reason": {"type": "string"}
+        },
+        "required": ["ticker", "company_name", "reason"]
+    }
+}
+
+GEMINI_RETRY_SECONDS = 60
+_gemini_retry_at = 0.0
+
+@lru_cache(maxsize=1)
+def _load_gemini_model():
+    """Configures and self-tests the Gemini model; raises if it is unusable, so a failure is never memoized."""
+    # Imported here, not at the top: the SDK and its protobuf stubs are slow to load and only this path needs them.
+    import google.generativeai as genai
+    # REST transport: gRPC's C-core does not cooperate with gevent's monkey-patched sockets.
+    genai.configure(api_key=GEMINI_API_KEY, transport="rest")
+    model = genai.GenerativeModel('gemini-2.5-flash', generation_config=genai.GenerationConfig(
+        response_mime_type="application/json", response_schema=RECOMMENDATION_SCHEMA
+    ))
+    # Cheap self-test: a bad key or exhausted quota fails here, not after a request has paid for its FMP calls.
+    model.count_tokens("ping")
+    return model
+
+def get_gemini_model():
+    """Returns the Gemini model, or None while it is unusable; a failed load is retried after GEMINI_RETRY_SECONDS."""
+    global _gemini_retry_at
+    if time.monotonic() < _gemini_retry_at: return None
+    try:
+        return _load_gemini_model()
+    except Exception as e:
+        logger.critical("Could not configure Gemini AI: %s", e)
+        _gemini_retry_at = time.monotonic() + GEMINI_RETRY_SECONDS
+        return None
+
+# --- Shared HTTP Session ---
+# One pooled session for every FMP call, so TCP/TLS sockets are reused across threads,
+# with transient rate-limit/gateway errors retried using backoff instead of dropped.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+# Single-attempt session for calls made under a lock, where retries would hold every waiter for up to four timeouts.
+SINGLE_TRY_SESSION = requests.Session()
+SINGLE_TRY_SESSION.mount("https://", HTTPAdapter(max_retries=0))
+# Long-lived pool for FMP fan-outs, sized to the session's socket pool and shared by all requests.
+FMP_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fmp")
 
 # --- Robust API Call Function ---
-def make_fmp_request(url):
+def make_fmp_request(path, params=None, timeout=15, session=SESSION):
     """Makes a request to the FMP API with robust error handling."""
     try:
-        response = requests.get(url, timeout=15)
+        # The key travels as a query param added here, so no caller ever builds a URL containing it.
+        response = session.get(FMP_BASE_URL + path, params={**(params or {}), 'apikey': FMP_API_KEY}, timeout=timeout)
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
     except requests.exceptions.RequestException as req_err:
-        print(f"FMP request error: {req_err}")
+        logger.warning("FMP request error: %s", req_err)
+    except orjson.JSONDecodeError as json_err:
+        logger.warning("FMP response was not valid JSON: %s", json_err)
     return None
 
+# --- Shared Response Cache ---
+class RedisCache:
+    """The diskcache get/set subset over Redis, so every worker and deploy shares one cache."""
+    def __init__(self, client, prefix):
+        self._client = client
+        self._prefix = prefix
+
+    def get(self, key, expire_time=False):
+        """With expire_time=True, returns (value, expiry as a Unix timestamp or None), as diskcache does."""
+        try:
+            if expire_time:
+                raw, pttl = self._client.pipeline().get(self._prefix + key).pttl(self._prefix + key).execute()
+            else:
+                raw, pttl = self._client.get(self._prefix + key), None
+        except redis.RedisError as redis_err:
+            logger.warning("Redis read failed, treating as a miss: %s", redis_err)
+            raw, pttl = None, None
+        value = orjson.loads(raw) if raw is not None else None
+        if not expire_time: return value
+        return value, (time.time() + pttl / 1000 if value is not None and pttl and pttl > 0 else None)
+
+    def set(self, key, value, expire=None):
+        try:
+            self._client.set(self._prefix + key, orjson.dumps(value), ex=expire)
+        except redis.RedisError as redis_err:
+            logger.warning("Redis write failed: %s", redis_err)
+
+if REDIS_URL:
+    import redis
+    # Short socket timeouts: a hung or unreachable Redis must raise RedisError (a miss), not stall every lookup.
+    _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    cache = RedisCache(_redis_client, "fmp:")
+    gemini_cache = RedisCache(_redis_client, "gemini:")
+else:
+    cache = diskcache.Cache('.fmp_cache', size_limit=2**30)
+    gemini_cache = diskcache.Cache('.gemini_cache')
+
+# --- FMP Response Cache ---
+# Per-endpoint TTLs (seconds): company data is stable for days, quotes only for a minute.
+UNIVERSE_TTL = 24 * 3600
+PROFILE_TTL = 7 * 24 * 3600
+RATIOS_TTL = 24 * 3600
+QUOTE_TTL = 60
+TECHNICALS_TTL = 60 * 60
+# In-process tier in front of the shared cache for the hottest endpoints: a hit skips even the disk/Redis read and decode.
+_PROFILE_CACHE = TTLCache(maxsize=2048, ttl=3600)
+_RATIOS_CACHE = TTLCache(maxsize=2048, ttl=3600)
+_QUOTE_CACHE = TTLCache(maxsize=2048, ttl=30)
+_memo_lock = threading.Lock()
+
+def _cache_key(path, params):
+    """Hashes an FMP path and its query params (never the apikey) into a cache key."""
+    query = urlencode(sorted((params or {}).items()))
+    return hashlib.blake2b(f"{path}?{query}".encode(), digest_size=16).hexdigest()
+
+def _cache_lookup(key, memo=None):
+    """Checks the in-process tier (if any), then the shared cache, promoting shared hits into memory.
+
+    Returns (data, expires_at), with expires_at a Unix timestamp or None if the entry never expires.
+    """
+    if memo is not None:
+        with _memo_lock:
+            entry = memo.get(key)
+        # Memo entries are (expires_at, data): a promoted hit keeps its shared-cache expiry instead of a fresh memo TTL.
+        if entry is not None and (entry[0] is None or entry[0] > time.time()): return entry[1], entry[0]
+    data, expires_at = cache.get(key, expire_time=True)
+    if data is not None and memo is not None:
+        with _memo_lock:
+            memo[key] = (expires_at, data)
+    return data, expires_at
+
+def _cache_store(key, data, ttl, memo=None):
+    """Writes a response to the shared cache and, if given, to the in-process tier."""
+    cache.set(key, data, expire=ttl)
+    if memo is not None:
+        with _memo_lock:
+            memo[key] = (time.time() + ttl, data)
+
+def cached_get_with_expiry(path, ttl, params=None, timeout=15, memo=None, session=SESSION):
+    """Like cached_get, but returns (data, expires_at) so a caller holding its own copy can expire it in step."""
+    key = _cache_key(path, params)
+    data, expires_at = _cache_lookup(key, memo)
+    if data is not None: return data, expires_at
+    data = make_fmp_request(path, params, timeout, session)
+    # Every endpoint used here answers with a list; FMP reports errors (e.g. an exhausted quota) as an object instead.
+    if not isinstance(data, list):
+        if data is not None: logger.warning("FMP error payload for %s: %s", path, data)
+        return None, None
+    if data: _cache_store(key, data, ttl, memo)
+    return data, time.time() + ttl
+
+def cached_get(path, ttl, params=None, timeout=15, memo=None):
+    """Returns the FMP JSON for a path, serving it from the cache tiers while it is fresh."""
+    return cached_get_with_expiry(path, ttl, params, timeout, memo)[0]
+
+def cached_get_many(lookups, timeout=15):
+    """Runs several (path, ttl, params, memo) lookups concurrently on FMP_POOL and returns their data in order.
+
+    A lookup that raises is logged and comes back as None, so one bad call can't sink the batch.
+    """
+    futures = [(path, FMP_POOL.submit(cached_get, path, ttl, params, timeout, memo)) for path, ttl, params, memo in lookups]
+    results = []
+    for path, future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.warning("FMP lookup for %s failed: %s", path, e)
+            results.append(None)
+    return results
+
+def fetch_bulk_profiles(tickers):
+    """Fetches profiles for many tickers, keyed by symbol: cached ones individually, the rest in one comma-separated FMP call."""
+    profiles, missing = {}, []
+    for ticker in tickers:
+        cached, _ = _cache_lookup(_cache_key(f"/v3/profile/{ticker}", None), _PROFILE_CACHE)
+        if cached: profiles[ticker] = cached[0]
+        else: missing.append(ticker)
+    if missing:
+        batch = make_fmp_request(f"/v3/profile/{','.join(missing)}")
+        for profile in batch if isinstance(batch, list) else []:
+            symbol = profile.get('symbol') if isinstance(profile, dict) else None
+            if not symbol: continue
+            profiles[symbol] = profile
+            # Stored under the single-ticker key, so a later dashboard lookup for this stock is a cache hit too.
+            _cache_store(_cache_key(f"/v3/profile/{symbol}", None), [profile], PROFILE_TTL, _PROFILE_CACHE)
+    return profiles
+
+# --- Stock Universe ---
+# Each country's liquid universe is fetched once a day and filtered in-process, so queries make no screener call once warm.
+# Entries are (expires_at, rows), expiring with the shared-cache copy they were built from;
+# a failed load is kept for UNIVERSE_RETRY_TTL so an FMP outage isn't re-fetched by every request.
+_universe_cache = {}
+_universe_locks = {}
+UNIVERSE_RETRY_TTL = 60
+# (connect, read) per socket wait, tried once: a cold load holds its country's lock for one attempt, not four.
+UNIVERSE_TIMEOUT = (5, 30)
+# FMP reports marketCap in the listing's own currency, so the ~$10M floor is set per country (INR at ~85/USD).
+MIN_MARKET_CAP = {"US": 1e7, "IN": 8.5e8}
+# Exchange suffixes FMP profiles cover (Indian listings); plain US symbols carry none.
+_SUPPORTED_SUFFIXES = ('.NS', '.BO')
+
+def _is_rankable(row, min_market_cap):
+    """Rejects screener rows with no price, a market cap at or below the country's floor, or an exchange suffix FMP cannot profile."""
+    symbol = row.get('symbol')
+    if not symbol or not row.get('price') or (row.get('marketCap') or 0) <= min_market_cap: return False
+    return '.' not in symbol or symbol.endswith(_SUPPORTED_SUFFIXES)
+
+def get_country_universe(country):
+    """Returns every stock trading over 50k shares a day in a country, largest market cap first."""
+    # One lock per country: a cold US load never queues IN queries, and waiters reuse the result instead of re-fetching.
+    with _universe_locks.setdefault(country, threading.Lock()):
+        expires_at, universe = _universe_cache.get(country, (0, None))
+        if time.time() >= expires_at:
+            rows, expires_at = cached_get_with_expiry(
+                "/v3/stock-screener", UNIVERSE_TTL, {**_UNIVERSE_PARAMS, 'country': country},
+                timeout=UNIVERSE_TIMEOUT, session=SINGLE_TRY_SESSION
+            )
+            min_market_cap = MIN_MARKET_CAP.get(country, MIN_MARKET_CAP["US"])
+            universe = sorted((row for row in rows or [] if isinstance(row, dict) and _is_rankable(row, min_market_cap)), key=lambda row: row.get('marketCap') or 0, reverse=True)
+            if not universe: expires_at = time.time() + UNIVERSE_RETRY_TTL
+            elif expires_at is None: expires_at = time.time() + UNIVERSE_TTL
+            _universe_cache[country] = (expires_at, universe)
+    return universe
+
+def get_candidate_stocks_from_fmp(country, price_limit):
+    """Returns the top 40 universe rows for a country, optionally below a price ceiling."""
+    universe = get_country_universe(country)
+    if price_limit is None: return universe[:40]
+    return list(islice((row for row in universe if row['price'] < price_limit), 40))
+
+# --- Data Aggregation ---
+def profiles_from_screener(rows):
+    """Builds prompt profiles straight from screener rows, or returns None if the rows lack the fields to rank on."""
+    if not all(row.get('companyName') and row.get('marketCap') is not None for row in rows): return None
+    return [{
+        "ticker": row.get('symbol'),
+        "companyName": row.get('companyName'),
+        "sector": row.get('sector'),
+        "price": row.get('price'),
+        "marketCap": row.get('marketCap'),
+        "beta": row.get('beta'),
+        "volume": row.get('volume'),
+        "lastAnnualDividend": row.get('lastAnnualDividend')
+    } for row in rows]
+
+def _merge_profile(profile, ratios_data):
+    """Merges one batch-profile row with that ticker's ratios-TTM into a prompt profile, or None on failure."""
+    ratios = ratios_data[0] if ratios_data else {}
+    if not isinstance(ratios, dict):
+        logger.warning("Skipping %s, unexpected ratios payload: %s", profile.get('symbol'), ratios)
+        return None
+    return {
+        "ticker": profile.get('symbol'),
+        "companyName": profile.get('companyName'),
+        "sector": profile.get('sector'),
+        "price": profile.get('price'),
+        "marketCap": profile.get('mktCap'),
+        "beta": profile.get('beta'),
+        "peRatio": ratios.get('priceEarningsRatioTTM'),
+        "pegRatio": ratios.get('pegRatioTTM'),
+        "profitMargin": ratios.get('netProfitMarginTTM'),
+        "returnOnEquity": ratios.get('returnOnEquityTTM'),
+        "debtToEquity": ratios.get('debtToEquityRatioTTM'),
+        "dividendYield": ratios.get('dividendYieldTTM')
+    }
+
+def profiles_from_fan_out(tickers):
+    """Builds prompt profiles from one batch profile call plus a per-ticker ratios-TTM call."""
+    # One batch call covers every profile; ratios-TTM is per-symbol, so fan those out over the pool.
+    profiles_by_ticker = fetch_bulk_profiles(tickers)
+    profiles = [profiles_by_ticker[ticker] for ticker in tickers if ticker in profiles_by_ticker]
+    ratios = cached_get_many([(f"/v3/ratios-ttm/{p['symbol']}", RATIOS_TTL, None, _RATIOS_CACHE) for p in profiles], timeout=10)
+    # A failed ticker comes back as None rather than raising, so one bad symbol can't sink the batch.
+    return [p for p in map(_merge_profile, profiles, ratios) if p is not None]
+
+# --- Query Parsing ---
+# Compiled once at import; both run on every recommendation request.
+_PRICE_RE = re.compile(r'(under|less than|below|upto)\s*(\d+)')
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_INDIA_TOKENS = frozenset({"indian", "india"})
+
+@lru_cache(maxsize=512)
+def parse_query(user_query):
+    """Returns the (country, price_limit) screen for a lower-cased query; repeated queries skip the regex work."""
+    tokens = set(_TOKEN_RE.findall(user_query))
+    country = "IN" if tokens & _INDIA_TOKENS else "US"
+    price_match = _PRICE_RE.search(user_query)
+    price_limit = int(price_match.group(2)) if price_match else None
+    return country, price_limit
+
+# --- Prompt ---
+MAX_NAME_LEN = 60
+_PROMPT_TMPL = Template(
+    "Stocks: $profiles_json\n"
+    "User goal: '$query'. Pick the top 3, each with a short, data-driven reason."
+)
+
+def _compact_profile(profile):
+    """Drops nulls, rounds floats to 3 places and caps the company name, to keep prompt tokens down."""
+    compact = {}
+    for key, value in profile.items():
+        if value is None: continue
+        if isinstance(value, float): value = round(value, 3)
+        elif key == "companyName": value = value[:MAX_NAME_LEN]
+        compact[key] = value
+    return compact
+
+# Same question over the same candidates -> reuse the earlier answer (from gemini_cache) for an hour instead of a 1-3s LLM call.
+GEMINI_TTL = 60 * 60
+
+def _gemini_cache_key(user_query, quant_profiles):
+    """Hashes the user query together with the sorted candidate tickers."""
+    tickers = ",".join(sorted(p['ticker'] for p in quant_profiles))
+    return hashlib.blake2b(f"{user_query}|{tickers}".encode(), digest_size=16).hexdigest()
+
+# --- Streamed Recommendations ---
+NDJSON_MIMETYPE = 'application/x-ndjson'
+_FORMAT_ERROR_CARD = {"ticker": "SYSTEM", "company_name": "AI Format Error", "reason": "The AI analysis module returned an invalid format."}
+_JSON_DECODER = json.JSONDecoder()
+
+class IncompleteJSONArray(ValueError):
+    """Raised when a streamed JSON array ends before its closing ']'."""
+
+def iter_json_array(chunks):
+    """Yields each object of a streamed JSON array as soon as its closing brace has arrived.
+
+    Raises IncompleteJSONArray if the chunks run out before the closing ']', so a cut-off reply is never mistaken for a full one.
+    """
+    buffer, pos = "", None
+    for chunk in chunks:
+        buffer += chunk
+        if pos is None:
+            start = buffer.find('[')
+            if start == -1: continue
+            pos = start + 1
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,': pos += 1
+            if pos >= len(buffer): break
+            if buffer[pos] == ']': return
+            try:
+                # orjson has no prefix decoder; the stdlib one stops at the end of the first complete value.
+                item, pos = _JSON_DECODER.raw_decode(buffer, pos)
+            except ValueError:
+                break  # Object not complete yet; wait for the next chunk.
+            yield item
+    raise IncompleteJSONArray("stream ended before the closing ']'")
+
+def stream_recommendations(model, prompt, cache_key):
+    """Streams Gemini's picks to the client as NDJSON, one line per pick, caching the full set once done."""
+    picks = []
+    try:
+        for pick in iter_json_array(chunk.text for chunk in model.generate_content(prompt, stream=True)):
+            picks.append(pick)
+            yield orjson.dumps(pick) + b"\n"
+    except IncompleteJSONArray:
+        # Same rule as the plain-JSON path: a cut-off reply (e.g. output token limit) is never cached.
+        logger.warning("Gemini reply was cut off after %d picks; not caching it", len(picks))
+        if not picks: yield orjson.dumps(_FORMAT_ERROR_CARD) + b"\n"
+        return
+    except Exception as e:
+        logger.exception("Fatal error streaming recommendation: %s", e)
+        if not picks: yield orjson.dumps(_FORMAT_ERROR_CARD) + b"\n"
+        return
+    if picks:
+        gemini_cache.set(cache_key, picks, expire=GEMINI_TTL)
+    else:
+        yield orjson.dumps(_FORMAT_ERROR_CARD) + b"\n"
+
 # --- Main Logic ---
 @app.route('/')
 def index():
@@ -43,38 +473,49 @@ def get_stock_recommendation():
     # In a real file, the full, working get_stock_recommendation function would be here.
     # For this upgrade, we are focusing on the *new* dashboard endpoint.
     # Let's paste the working logic back in to be safe.
-    print("\n--- NEW RECOMMENDATION REQUEST RECEIVED ---")
+    logger.info("New recommendation request received")
+    model = get_gemini_model()
+    if model is None:
+        return jsonify([{"ticker": "SYSTEM", "company_name": "AI Unavailable", "reason": "The AI analysis module is offline, so no recommendations can be made right now."}])
     try:
         user_query = request.json.get('query', '').lower()
-        country = "IN" if "indian" in user_query else "US"
-        base_url = f"https://financialmodelingprep.com/api/v3/stock-screener?country={country}&apikey={FMP_API_KEY}"
-        price_match = re.search(r'(under|less than|below|upto)\s*(\d+)', user_query)
-        if price_match: base_url += f"&priceLowerThan={price_match.group(2)}"
-        screener_url = f"{base_url}&volumeMoreThan=50000&limit=40"
-        candidate_list = make_fmp_request(screener_url)
+        country, price_limit = parse_query(user_query)
+        logger.info("Screening %s stocks, price limit: %s", country, price_limit)
+        candidate_list = get_candidate_stocks_from_fmp(country, price_limit)
         if not candidate_list:
             return jsonify([{"ticker": "SYSTEM", "company_name": "No Stocks Found", "reason": "My screening system could not find any stocks matching your specific criteria."}])
-        candidate_stocks = [stock.get('symbol') for stock in candidate_list if stock.get('symbol')]
-        quant_profiles = []
-        for ticker in candidate_stocks[:15]:
-            profile_url = f"https://financialmodelingprep.com/api/v3/profile/{ticker}?apikey={FMP_API_KEY}"
-            profile_data_list = make_fmp_request(profile_url)
-            if not profile_data_list or len(profile_data_list) == 0: continue
-            quant_profiles.append({"ticker": profile_data_list[0].get('symbol'), "companyName": profile_data_list[0].get('companyName')})
+        candidate_rows = [stock for stock in candidate_list if stock.get('symbol')][:15]
+        # The screener rows usually carry enough to rank on; only fall back to the per-ticker fan-out when they don't.
+        quant_profiles = profiles_from_screener(candidate_rows)
+        if quant_profiles is None:
+            quant_profiles = profiles_from_fan_out([stock['symbol'] for stock in candidate_rows])
         if not quant_profiles:
              return jsonify([{"ticker": "SYSTEM", "company_name": "Data Aggregation Failed", "reason": "Could not retrieve profiles for the found stocks."}])
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        prompt = f"**CRITICAL INSTRUCTION:** Your ONLY output must be a valid JSON array of objects. Do NOT include any text before the opening '[' or after the final ']'.\n**Task:** Analyze these stocks: {json.dumps(quant_profiles)} for a user whose goal is '{user_query}'. Select the top 3 and give a short, data-driven reason. \n**JSON Format:** `[{{\"ticker\": \"...\", \"company_name\": \"...\", \"reason\": \"...\"}}]`"
-        response = model.generate_content(prompt)
-        start_index = response.text.find('[')
-        end_index = response.text.rfind(']')
-        if start_index != -1 and end_index != -1:
-            json_str = response.text[start_index : end_index + 1]
-            return jsonify(json.loads(json_str))
+        cache_key = _gemini_cache_key(user_query, quant_profiles)
+        cached_recommendations = gemini_cache.get(cache_key)
+        if cached_recommendations is not None:
+            logger.info("Serving cached AI recommendation")
+            return jsonify(cached_recommendations)
+        profiles_json = orjson.dumps([_compact_profile(p) for p in quant_profiles]).decode()
+        prompt = _PROMPT_TMPL.substitute(query=user_query, profiles_json=profiles_json)
+        if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+            # Clients that ask for NDJSON get each pick flushed as soon as Gemini finishes writing it.
+            return Response(stream_recommendations(model, prompt, cache_key), mimetype=NDJSON_MIMETYPE)
+        # Stream the answer and accumulate chunks as they arrive instead of blocking on the full completion.
+        response_stream = model.generate_content(prompt, stream=True)
+        response_text = "".join(chunk.text for chunk in response_stream)
+        try:
+            recommendations = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            # Only reachable if the reply was cut short (e.g. output token limit).
+            recommendations = None
+        if recommendations is not None:
+            gemini_cache.set(cache_key, recommendations, expire=GEMINI_TTL)
+            return jsonify(recommendations)
         else:
-            return jsonify([{"ticker": "SYSTEM", "company_name": "AI Format Error", "reason": "The AI analysis module returned an invalid format."}])
+            return jsonify([_FORMAT_ERROR_CARD])
     except Exception as e:
-        print(f"FATAL ERROR in recommendation: {e}")
+        logger.exception("Fatal error in recommendation: %s", e)
         return jsonify({"error": "A fatal internal server error occurred."}), 500
 
 
@@ -84,18 +525,19 @@ def get_stock_dashboard(ticker):
     """
     This single, powerful endpoint gathers all data needed for the detailed dashboard view.
     """
-    print(f"\n--- GATHERING DASHBOARD DATA FOR {ticker} ---")
+    logger.info("Gathering dashboard data for %s", ticker)
     try:
-        # 1. Company Profile and Live Price (Quote)
-        profile_data = make_fmp_request(f"https://financialmodelingprep.com/api/v3/profile/{ticker}?apikey={FMP_API_KEY}")
-        quote_data = make_fmp_request(f"https://financialmodelingprep.com/api/v3/quote/{ticker}?apikey={FMP_API_KEY}")
-        
-        # 2. Fundamental Data (Financial Ratios)
-        ratios_data = make_fmp_request(f"https://financialmodelingprep.com/api/v3/ratios-ttm/{ticker}?apikey={FMP_API_KEY}")
-
-        # 3. Technical Data (RSI and SMA) - Your paid plan is essential for this!
-        rsi_data = make_fmp_request(f"https://financialmodelingprep.com/api/v4/technical_indicator/daily/{ticker}?period=14&type=rsi&apikey={FMP_API_KEY}")
-        sma_data = make_fmp_request(f"https://financialmodelingprep.com/api/v4/technical_indicator/daily/{ticker}?period=50&type=sma&apikey={FMP_API_KEY}")
+        # The five lookups are independent, so issue them together: the endpoint waits one round-trip, not five.
+        profile_data, quote_data, ratios_data, rsi_data, sma_data = cached_get_many([
+            # 1. Company Profile and Live Price (Quote)
+            (f"/v3/profile/{ticker}", PROFILE_TTL, None, _PROFILE_CACHE),
+            (f"/v3/quote/{ticker}", QUOTE_TTL, None, _QUOTE_CACHE),
+            # 2. Fundamental Data (Financial Ratios)
+            (f"/v3/ratios-ttm/{ticker}", RATIOS_TTL, None, _RATIOS_CACHE),
+            # 3. Technical Data (RSI and SMA) - Your paid plan is essential for this!
+            (f"/v4/technical_indicator/daily/{ticker}", TECHNICALS_TTL, _RSI_PARAMS, None),
+            (f"/v4/technical_indicator/daily/{ticker}", TECHNICALS_TTL, _SMA_PARAMS, None),
+        ])
 
         # --- Defensive Data Handling ---
         # Ensure we have the most critical data before proceeding
@@ -142,11 +584,11 @@ def get_stock_dashboard(ticker):
             }
         }
         
-        print(f"SUCCESS: Assembled full dashboard for {ticker}.")
+        logger.info("Assembled full dashboard for %s", ticker)
         return jsonify(dashboard_data)
 
     except Exception as e:
-        print(f"FATAL ERROR assembling dashboard for {ticker}: {e}")
+        logger.exception("Fatal error assembling dashboard for %s: %s", ticker, e)
         return jsonify({"error": "An internal server error occurred while building the dashboard."}), 500
 
 if __name__ == '__main__':
@@ -68,13 +68,19 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const response = await fetch('/api/get_stock_recommendation', {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                // Ask for NDJSON so cards can render as the AI writes them; system messages and cached answers still come back as JSON.
+                headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson, application/json' },
                 body: JSON.stringify({ query: query }),
             });
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            const data = await response.json();
-            const resultsHTML = createResultsDisplay(data);
-            displayBotMessage("Here are my findings. Click on any stock for a detailed view.", resultsHTML);
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType.startsWith('application/x-ndjson')) {
+                await displayStreamedResults(response);
+            } else {
+                const data = await response.json();
+                const resultsHTML = createResultsDisplay(data);
+                displayBotMessage("Here are my findings. Click on any stock for a detailed view.", resultsHTML);
+            }
         } catch (error) {
             console.error("Error in handleUserQuery:", error);
             displayBotMessage(`<p>I'm sorry, a critical error occurred. Please try again.</p>`);
@@ -100,22 +106,54 @@ document.addEventListener('DOMContentLoaded', () => {
         messageElement.innerHTML = `<p class="message-text">${text}</p>${htmlContent}`;
         chatWindow.appendChild(messageElement);
         scrollToBottom();
+        return messageElement;
     }
     
     function createResultsDisplay(data) {
         if (!data || data.length === 0) return "<p>No suitable stocks were found.</p>";
-        if (data[0].ticker === "SYSTEM") {
-            const systemMessage = data[0];
-            return `<div class="system-card"><div class="card-header"><h3 class="ticker-symbol">System Message</h3><p class="company-name">${systemMessage.company_name}</p></div><div class="card-body"><p class="reason">${systemMessage.reason}</p></div></div>`;
-        }
+        if (data[0].ticker === "SYSTEM") return createSystemCard(data[0]);
         let cardsHTML = '<div class="results-grid">';
         data.forEach(stock => {
-            cardsHTML += `<div class="stock-card" data-ticker="${stock.ticker}"><div class="card-header"><h3 class="ticker-symbol">${stock.ticker}</h3><p class="company-name">${stock.company_name || 'N/A'}</p></div><div class="card-body"><p class="reason">${stock.reason}</p></div></div>`;
+            cardsHTML += createStockCard(stock);
         });
         cardsHTML += '</div>';
         return cardsHTML;
     }
 
+    function createSystemCard(systemMessage) {
+        return `<div class="system-card"><div class="card-header"><h3 class="ticker-symbol">System Message</h3><p class="company-name">${systemMessage.company_name}</p></div><div class="card-body"><p class="reason">${systemMessage.reason}</p></div></div>`;
+    }
+
+    function createStockCard(stock) {
+        return `<div class="stock-card" data-ticker="${stock.ticker}"><div class="card-header"><h3 class="ticker-symbol">${stock.ticker}</h3><p class="company-name">${stock.company_name || 'N/A'}</p></div><div class="card-body"><p class="reason">${stock.reason}</p></div></div>`;
+    }
+
+    async function displayStreamedResults(response) {
+        // Each NDJSON line is one finished pick; append its card the moment the line arrives.
+        const messageElement = displayBotMessage("Here are my findings. Click on any stock for a detailed view.", '<div class="results-grid"></div>');
+        const grid = messageElement.querySelector('.results-grid');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let cardCount = 0;
+        while (true) {
+            const { done, value } = await reader.read();
+            if (value) buffer += decoder.decode(value, { stream: true });
+            let newlineIndex;
+            while ((newlineIndex = buffer.indexOf('\n')) !== -1) {
+                const line = buffer.slice(0, newlineIndex).trim();
+                buffer = buffer.slice(newlineIndex + 1);
+                if (!line) continue;
+                const stock = JSON.parse(line);
+                grid.insertAdjacentHTML('beforeend', stock.ticker === "SYSTEM" ? createSystemCard(stock) : createStockCard(stock));
+                cardCount++;
+                scrollToBottom();
+            }
+            if (done) break;
+        }
+        if (cardCount === 0) grid.outerHTML = "<p>No suitable stocks were found.</p>";
+    }
+
     function scrollToBottom() {
         chatWindow.scrollTop = chatWindow.scrollHeight;
     }